@@ -1,10 +1,15 @@
 import os
-import json
 import sqlite3
+import orjson
 import requests
 import time
 import logging
 import argparse
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from itertools import islice
 from pathlib import Path
 from typing import Optional
 import re
@@ -20,6 +25,29 @@ JSON_DIR = os.environ.get("SHIPXPLORER_JSON_DIR", "jsons")
 REQUEST_TIMEOUT = float(os.environ.get("SHIPXPLORER_TIMEOUT", 15.0))
 SLEEP_SECONDS = float(os.environ.get("SHIPXPLORER_SLEEP", 0.1))
 MAX_FETCH_RETRIES = int(os.environ.get("SHIPXPLORER_MAX_RETRIES", 3))
+WORKERS = int(os.environ.get("SHIPXPLORER_WORKERS", 8))
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("SHIPXPLORER_MAX_CONCURRENT", 8))
+PROCESSES = int(os.environ.get("SHIPXPLORER_PROCESSES", 0))
+COMMIT_EVERY = int(os.environ.get("SHIPXPLORER_COMMIT_EVERY", 100))
+
+# SQLite tuning for bulk loads. The default set keeps the DB crash-safe (WAL);
+# the unsafe set trades durability for speed and is only enabled via --unsafe-fast.
+SQLITE_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+    PRAGMA wal_autocheckpoint=10000;
+"""
+SQLITE_UNSAFE_PRAGMAS = """
+    PRAGMA journal_mode=MEMORY;
+    PRAGMA synchronous=OFF;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA locking_mode=EXCLUSIVE;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+"""
 
 # Headers to mimic a browser
 HEADERS = {
@@ -28,6 +56,24 @@ HEADERS = {
     "Accept": "application/json",
 }
 
+# Shared HTTP session so connections (TCP + TLS) are reused across pages
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount(
+    "https://",
+    requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=0),
+)
+# Caps in-flight HTTP requests across worker threads; each slot is held for an
+# extra SLEEP_SECONDS after its request to keep the per-slot request rate polite.
+REQUEST_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+# Characters stripped from vessel names, and whitespace runs collapsed to one space
+_NAME_DELETE_TABLE = str.maketrans("", "", "\"'`!*-._")
+_WS_RE = re.compile(r"\s+")
+# Anything normalize_name would change in an already upper-case name: deletable
+# characters, non-space whitespace, doubled spaces, or leading/trailing spaces
+_DIRTY_NAME_RE = re.compile(r"[\"'`!*\-._]|[^\S ]|  |^ | $")
+
 # Setup basic logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,13 +84,15 @@ logger = logging.getLogger(__name__)
 
 
 def setup_environment(
-    json_dir: str = JSON_DIR, db_name: str = DB_NAME
+    json_dir: str = JSON_DIR, db_name: str = DB_NAME, unsafe_fast: bool = False
 ) -> sqlite3.Connection:
     """Ensures the JSON storage directory and Database exist and returns a DB connection."""
     Path(json_dir).mkdir(parents=True, exist_ok=True)
 
-    conn = sqlite3.connect(db_name)
+    # Autocommit mode: transactions are managed explicitly with BEGIN/COMMIT
+    conn = sqlite3.connect(db_name, isolation_level=None)
     cursor = conn.cursor()
+    cursor.executescript(SQLITE_UNSAFE_PRAGMAS if unsafe_fast else SQLITE_PRAGMAS)
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS vessels (
@@ -68,10 +116,10 @@ def setup_environment(
         )
     """
     )
-    conn.commit()
     return conn
 
 
+@lru_cache(maxsize=65536)
 def normalize_name(s: str) -> str | None:
     """Normalize vessel names by:
     - removing certain punctuation characters (quotes, backticks, exclamation marks)
@@ -79,46 +127,55 @@ def normalize_name(s: str) -> str | None:
     - stripping leading/trailing whitespace
     - converting to title case
 
-    Returns an empty string for falsy inputs.
+    Returns an empty string for falsy inputs. Results are memoized since the
+    same names recur across pages.
     """
     if not s:
         return None
 
-    # Remove quotes, backticks, exclamation marks (anywhere in the name)
-    cleaned = re.sub(r"[\"'`!*\-._]+", "", s)
+    # Fast path: names that are already normalized are returned unchanged
+    if s.isupper() and not _DIRTY_NAME_RE.search(s):
+        return s
 
-    # Replace any sequence of whitespace (including tabs/newlines) with a single space
-    cleaned = re.sub(r"\s+", " ", cleaned)
+    # Remove quotes, backticks, exclamation marks (anywhere in the name), then
+    # replace any sequence of whitespace (including tabs/newlines) with a single space
+    cleaned = _WS_RE.sub(" ", s.translate(_NAME_DELETE_TABLE))
 
     cleaned = cleaned.strip().upper()
     return cleaned or None
 
 
-def save_json_to_disk(file_path: str, data: dict) -> None:
-    """Write JSON data to disk. Overwrites atomically where possible."""
+def save_json_to_disk(file_path: str, raw: bytes) -> None:
+    """Write raw JSON bytes to disk. Overwrites atomically where possible."""
     tmp_path = f"{file_path}.tmp"
-    with open(tmp_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
     os.replace(tmp_path, file_path)
 
 
+def rate_limited_get(url: str, **kwargs) -> requests.Response:
+    """GET through the shared session while holding one of the request slots."""
+    with REQUEST_SLOTS:
+        try:
+            return SESSION.get(url, **kwargs)
+        finally:
+            time.sleep(SLEEP_SECONDS)
+
+
 def fetch_page_from_network(
     page_number: int,
     base_url: str = BASE_URL,
-    headers: dict = HEADERS,
     timeout: float = REQUEST_TIMEOUT,
     max_retries: int = MAX_FETCH_RETRIES,
-) -> Optional[dict]:
-    """Fetch a page from the remote API with simple retry/backoff logic."""
+) -> Optional[bytes]:
+    """Fetch a page's raw JSON body from the remote API with simple retry/backoff logic."""
     params = {"vessel_list": "true", "page": page_number}
     backoff = 0.5
     for attempt in range(1, max_retries + 1):
         try:
-            resp = requests.get(
-                base_url, params=params, headers=headers, timeout=timeout
-            )
+            resp = rate_limited_get(base_url, params=params, timeout=timeout)
             resp.raise_for_status()
-            return resp.json()
+            return resp.content
         except requests.exceptions.RequestException as e:
             logger.warning(
                 "Request error on page %s attempt %s/%s: %s",
@@ -127,9 +184,6 @@ def fetch_page_from_network(
                 max_retries,
                 e,
             )
-        except json.JSONDecodeError as e:
-            logger.error("Failed to decode JSON for page %s: %s", page_number, e)
-            return None
 
         time.sleep(backoff)
         backoff *= 2
@@ -140,63 +194,112 @@ def fetch_page_from_network(
     return None
 
 
+def page_file_name(page_number: int) -> str:
+    """Name of the JSON cache file for a page."""
+    return f"page_{page_number}.json"
+
+
 def get_page_data(
     page_number: int,
     json_dir: str = JSON_DIR,
     base_url: str = BASE_URL,
     use_cache: bool = True,
     timeout: float = REQUEST_TIMEOUT,
+    is_cached: Optional[bool] = None,
 ) -> Optional[dict]:
-    """Loads from disk if available, otherwise fetches from API."""
-    file_path = os.path.join(json_dir, f"page_{page_number}.json")
+    """Loads from disk if available, otherwise fetches from API.
+
+    ``is_cached`` lets callers that already listed ``json_dir`` skip the
+    per-page existence check on disk.
+    """
+    file_path = os.path.join(json_dir, page_file_name(page_number))
+    if is_cached is None:
+        is_cached = os.path.exists(file_path)
 
     # 1. Check if file already exists on disk
-    if use_cache and os.path.exists(file_path):
+    if use_cache and is_cached:
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except (OSError, json.JSONDecodeError) as e:
+            with open(file_path, "rb") as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError) as e:
             logger.warning(
                 "Failed to read cached JSON %s: %s (will try network)", file_path, e
             )
 
     # 2. Fetch from HTTP if not on disk or cache invalid
-    data = fetch_page_from_network(
-        page_number, base_url=base_url, headers=HEADERS, timeout=timeout
-    )
-    if data is None:
+    raw = fetch_page_from_network(page_number, base_url=base_url, timeout=timeout)
+    if raw is None:
+        return None
+
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError as e:
+        logger.error("Failed to decode JSON for page %s: %s", page_number, e)
         return None
 
+    # The body is already valid JSON, so cache it as-is rather than re-serializing
     try:
-        save_json_to_disk(file_path, data)
+        save_json_to_disk(file_path, raw)
     except OSError as e:
         logger.warning("Failed to save JSON to disk %s: %s", file_path, e)
 
-    # Rate limiting only applied on actual HTTP requests
-    time.sleep(SLEEP_SECONDS)
     return data
 
 
-def parse_and_save(conn: sqlite3.Connection, data: dict, batch_size: int = 500) -> bool:
-    """Maps obfuscated JSON keys to database columns and saves them in batches."""
+def to_float(x) -> float | None:
+    """Coerce an API value to float, returning None for missing or invalid values."""
+    if x is None:
+        return None
+    # Numbers (the common case) never need the exception handler
+    cls = type(x)
+    if cls is float:
+        return x
+    if cls is int:
+        return float(x)
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return None
+
+
+# Obfuscated API keys, in the same order as the INSERT columns in save_rows
+_VESSEL_KEYS = (
+    "susi",  # mmsi
+    "simo",  # imo
+    "snam",  # name (normalized)
+    "scgtdec",  # vessel_type
+    "sorgco",  # origin_country
+    "sorgcc",  # origin_country_code
+    "sorg",  # origin_port_code
+    "sorgna",  # origin_port
+    "say",  # flag_country
+    "sayc",  # flag_country_code
+    "slen",  # length
+    "bea",  # beam
+    "snas",  # nav_status
+    "status",  # status
+    "scal",  # callsign
+    "la",  # latitude
+    "lo",  # longitude
+)
+_NAME_INDEX = 2
+_FLOAT_INDEXES = (10, 11, 15, 16)  # length, beam, latitude, longitude
+
+
+def build_rows(data: list) -> list[list]:
+    """Maps obfuscated JSON vessel records to rows in database column order.
+
+    Does not touch the database, so it can run in worker processes.
+    """
     if not data:
         logger.debug("No 'vessels' key in data")
-        return False
+        return []
 
     # vessels = data.get("vessels")
     vessels = data
     if not vessels:
         logger.debug("Empty vessels list")
-        return False
-
-    query = """
-        INSERT OR REPLACE INTO vessels (
-            mmsi, imo, name, vessel_type, origin_country, 
-            origin_country_code, origin_port_code, origin_port, 
-            flag_country, flag_country_code, length, beam,
-            nav_status, status, callsign, latitude, longitude
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """
+        return []
 
     entries = []
     for v in vessels:
@@ -204,67 +307,66 @@ def parse_and_save(conn: sqlite3.Connection, data: dict, batch_size: int = 500)
             logger.debug("Skipping non-dict vessel entry: %s", type(v))
             continue
 
-        mmsi = v.get("susi")
-        if not mmsi:
+        vals = [v.get(k) for k in _VESSEL_KEYS]
+        if not vals[0]:
             # Skip records without a primary key
             logger.debug("Skipping vessel without MMSI: %s", v)
             continue
 
-        def to_float(x):
-            try:
-                return float(x) if x is not None else None
-            except (TypeError, ValueError):
-                return None
-
-        lat = to_float(v.get("la"))
-        lon = to_float(v.get("lo"))
-        length = to_float(v.get("slen"))
-        beam = to_float(v.get("bea"))
-
-        entries.append(
-            (
-                str(mmsi),  # mmsi
-                v.get("simo"),  # imo
-                normalize_name(v.get("snam")),  # name (normalized)
-                v.get("scgtdec"),  # vessel_type
-                v.get("sorgco"),  # origin_country
-                v.get("sorgcc"),  # origin_country_code
-                v.get("sorg"),  # origin_port_code
-                v.get("sorgna"),  # origin_port
-                v.get("say"),  # flag_country
-                v.get("sayc"),  # flag_country_code
-                length,  # length
-                beam,  # beam
-                v.get("snas"),  # nav_status
-                v.get("status"),  # status
-                v.get("scal"),  # callsign
-                lat,  # latitude
-                lon,  # longitude
-            )
-        )
+        vals[0] = str(vals[0])
+        vals[_NAME_INDEX] = normalize_name(vals[_NAME_INDEX])
+        for i in _FLOAT_INDEXES:
+            vals[i] = to_float(vals[i])
+        entries.append(vals)
 
-        # Flush batches periodically
-        if len(entries) >= batch_size:
-            try:
-                with conn:
-                    conn.executemany(query, entries)
-            except sqlite3.DatabaseError as e:
-                logger.error("Database error during batch insert: %s", e)
-                return False
-            entries = []
-
-    # Final flush
-    if entries:
-        try:
-            with conn:
-                conn.executemany(query, entries)
-        except sqlite3.DatabaseError as e:
-            logger.error("Database error during final insert: %s", e)
-            return False
+    return entries
+
+
+def save_rows(conn: sqlite3.Connection, rows: list[list]) -> bool:
+    """Saves prebuilt vessel rows with a single executemany.
+
+    The rows are written under a savepoint: inside a caller's transaction a
+    failed page is rolled back on its own, otherwise the page is committed.
+    """
+    if not rows:
+        return True
+
+    query = """
+        INSERT OR REPLACE INTO vessels (
+            mmsi, imo, name, vessel_type, origin_country, 
+            origin_country_code, origin_port_code, origin_port, 
+            flag_country, flag_country_code, length, beam,
+            nav_status, status, callsign, latitude, longitude
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+
+    conn.execute("SAVEPOINT save_rows")
+    try:
+        conn.executemany(query, rows)
+    except BaseException as e:
+        # Undo any rows already written so the page is all-or-nothing
+        conn.execute("ROLLBACK TO save_rows")
+        conn.execute("RELEASE save_rows")
+        if not isinstance(e, sqlite3.DatabaseError):
+            raise
+        logger.error("Database error during insert: %s", e)
+        return False
 
+    conn.execute("RELEASE save_rows")
     return True
 
 
+def load_page_rows(page_number: int, **kwargs) -> Optional[list[list]]:
+    """Loads a page (see get_page_data) and converts it to database rows.
+
+    Returns None when the page has no data, so callers can stop scraping.
+    """
+    data = get_page_data(page_number, **kwargs)
+    if not data:
+        return None
+    return build_rows(data)
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="ShipXplorer vessels scraper (safe mode)"
@@ -286,35 +388,106 @@ def main():
     parser.add_argument(
         "--timeout", type=float, default=REQUEST_TIMEOUT, help="HTTP timeout seconds"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help="Number of threads fetching/loading pages concurrently",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=PROCESSES,
+        help="Load and parse pages in this many worker processes instead of "
+        "threads (best for re-importing from a warm cache; 0 = use threads)",
+    )
+    parser.add_argument(
+        "--commit-every",
+        type=int,
+        default=COMMIT_EVERY,
+        help="Number of pages written per SQLite transaction",
+    )
+    parser.add_argument(
+        "--unsafe-fast",
+        action="store_true",
+        help="Disable SQLite journaling/fsync for maximum insert speed (not crash-safe)",
+    )
     args = parser.parse_args()
 
-    conn = setup_environment(json_dir=args.json_dir, db_name=args.db)
+    conn = setup_environment(
+        json_dir=args.json_dir, db_name=args.db, unsafe_fast=args.unsafe_fast
+    )
     logger.info(
         "Processing pages %s..%s (cache: %s)", args.start, args.end, args.json_dir
     )
 
+    # Snapshot the cache directory once instead of stat()ing every page file
+    cached_files = set(os.listdir(args.json_dir))
+
+    # Pages are loaded and converted to rows concurrently but consumed in order
+    # on this thread, so SQLite keeps a single writer and we still stop at the
+    # first missing page. Processes sidestep the GIL for warm-cache re-imports.
+    if args.processes:
+        executor = ProcessPoolExecutor(max_workers=args.processes)
+    else:
+        executor = ThreadPoolExecutor(max_workers=args.workers)
+    load_rows = partial(
+        load_page_rows,
+        json_dir=args.json_dir,
+        base_url=args.base_url,
+        use_cache=not args.no_network,
+        timeout=args.timeout,
+    )
+
+    def submit(page: int):
+        # Pass a per-page flag rather than the whole listing, which would be
+        # pickled into every task when using worker processes
+        return executor.submit(
+            load_rows, page, is_cached=page_file_name(page) in cached_files
+        )
+
+    pages = iter(range(args.start, args.end + 1))
+    # Keep only a small window of pages in flight so workers cannot run far ahead
+    # of the writer (memory) or past the first missing page (network)
+    window = 2 * (args.processes or args.workers)
+    # Pages are committed in groups of --commit-every; whatever is pending is
+    # committed on exit, including Ctrl-C, so no finished page is lost.
+    conn.execute("BEGIN")
+    pages_since_commit = 0
     try:
-        for page in range(args.start, args.end + 1):
+        pending = deque((page, submit(page)) for page in islice(pages, window))
+        while pending:
+            page, future = pending.popleft()
+            next_page = next(pages, None)
+            if next_page is not None:
+                pending.append((next_page, submit(next_page)))
+
+            rows = future.result()
             # Using '\r' to update the same line in the console
             print(f"Working on page {page}/{args.end}...", end="\r", flush=True)
 
-            data = get_page_data(
-                page,
-                json_dir=args.json_dir,
-                base_url=args.base_url,
-                use_cache=not args.no_network,
-                timeout=args.timeout,
-            )
-            if data:
-                parse_and_save(conn, data)
+            if rows is not None:
+                save_rows(conn, rows)
             else:
                 logger.warning(
                     "No data found or failed to fetch page %s; stopping.", page
                 )
                 break
 
+            pages_since_commit += 1
+            if pages_since_commit >= args.commit_every:
+                conn.execute("COMMIT")
+                conn.execute("BEGIN")
+                pages_since_commit = 0
+
     finally:
+        # Persist finished pages before waiting on in-flight workers, which can
+        # take up to timeout x retries on Ctrl-C
+        if conn.in_transaction:
+            conn.execute("COMMIT")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
         conn.close()
+        executor.shutdown(cancel_futures=True)
         print()  # ensure newline after progress
 
     logger.info("Process finished. Data is stored in SQLite and JSON cache.")
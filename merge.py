@@ -1,11 +1,75 @@
+import logging
 import sqlite3
-import json
+import sys
+import orjson
 import os
 from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 import csv
 from typing import Any
 
+# Setup basic logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%H:%M:%S",
+)
+logger = logging.getLogger(__name__)
+
+# SQLite tuning for bulk loads (WAL keeps the DB crash-safe)
+SQLITE_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+"""
+
+
+@lru_cache(maxsize=None)
+def normalize_upper(s: str | None) -> str | None:
+    """Strip and upper-case a country name/code; memoized as few distinct values exist."""
+    return s.strip().upper() if s else None
+
+
+# Every character str.strip() removes, so SQL trim() agrees with Python on
+# which flag codes are blank
+WHITESPACE = "".join(c for c in map(chr, range(sys.maxunicode + 1)) if c.isspace())
+
+MERGED_COLUMNS = (
+    "mmsi",
+    "imo",
+    "name",
+    "vessel_type",
+    "callsign",
+    "flag_country_code",
+    "flag_country",
+    "length",
+    "beam",
+)
+
+
+def chunked_insert(cursor: sqlite3.Cursor, rows: list[list], chunk: int = 500):
+    """Insert rows into the merged vessels table using multi-row VALUES statements.
+
+    Each statement carries up to ``chunk`` rows, capped so the bound parameters
+    stay within SQLite's host-parameter limit.
+    """
+    cols = len(MERGED_COLUMNS)
+    max_vars = cursor.connection.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    chunk = max(1, min(chunk, max_vars // cols))
+    placeholder = "(" + ", ".join(["?"] * cols) + ")"
+    prefix = f"INSERT INTO vessels ({', '.join(MERGED_COLUMNS)}) VALUES "
+    for i in range(0, len(rows), chunk):
+        batch = rows[i : i + chunk]
+        # noinspection SqlDialectInspection
+        cursor.execute(
+            prefix + ", ".join([placeholder] * len(batch)),
+            [v for row in batch for v in row],
+        )
+        print(f"Merged {i + len(batch)}/{len(rows)} vessels...", end="\r")
+
 
 def get_countries_file(merged_db_path: str) -> Path:
     return Path(merged_db_path).with_suffix(".countries.json")
@@ -39,8 +103,8 @@ def load_countries_mapping(cursor: sqlite3.Cursor) -> dict[Any, Any] | None:
     countries_file = get_countries_file("merged_vessels.db")
     if countries_file.exists():
         try:
-            with countries_file.open("r", encoding="utf-8") as f:
-                loaded = json.load(f)
+            with countries_file.open("rb") as f:
+                loaded = orjson.loads(f.read())
                 for k, v in loaded.items() if isinstance(loaded, dict) else []:
                     if not k:
                         continue
@@ -71,8 +135,10 @@ def save_countries_mapping(countries: dict[Any, Any]):
     data = OrderedDict(countries.items())
     try:
         tmp_path = countries_file.with_suffix(".countries.json.tmp")
-        with tmp_path.open("w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False, sort_keys=True)
+        with tmp_path.open("wb") as f:
+            f.write(
+                orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2)
+            )
         # Atomic replace
         os.replace(str(tmp_path), str(countries_file))
     except Exception as e:
@@ -87,6 +153,7 @@ def merge_databases(sx_path: str, vt_path: str, merged_db_path: str):
     # Create the merged database
     merged_conn = sqlite3.connect(merged_db_path)
     cursor = merged_conn.cursor()
+    cursor.executescript(SQLITE_PRAGMAS)
 
     # Create the vessels table in the merged database
     # noinspection SqlDialectInspection
@@ -115,55 +182,70 @@ def merge_databases(sx_path: str, vt_path: str, merged_db_path: str):
     # Countries mapping: normalized country name (UPPER, stripped) -> country code
     countries = load_countries_mapping(sx_cur)
 
+    # Index ShipXplorer IMOs so the fallback lookup below never scans the table
+    # (mmsi is already covered by the primary key)
+    # noinspection SqlDialectInspection
+    sx_cur.execute("CREATE INDEX IF NOT EXISTS idx_vessels_imo ON vessels(imo)")
+    sx_db.commit()
+
+    # Resolve each vessel's fallback ShipXplorer match (first row, in table order,
+    # matching its MMSI or IMO) inside the same query instead of one lookup per
+    # row. Each side is a single index seek for its lowest rowid, and the lookup
+    # only runs for vessels whose own flag code is blank.
+    vt_db.execute("ATTACH DATABASE ? AS sx", (sx_path,))
     # noinspection SqlDialectInspection
     vt_cur.execute(
-        "SELECT mmsi, imo, name, vessel_type, callsign, flag_country_code, flag_country, length, beam FROM vessels"
+        """
+        SELECT m.mmsi, m.imo, m.name, m.vessel_type, m.callsign,
+               m.flag_country_code, m.flag_country, m.length, m.beam,
+               m.sx_rowid, s.flag_country_code
+        FROM (
+            SELECT v.*,
+                   CASE WHEN v.flag_country_code IS NULL
+                             OR trim(v.flag_country_code, :whitespace) = ''
+                   THEN (SELECT min(r) FROM (
+                            SELECT min(rowid) AS r FROM sx.vessels WHERE mmsi = v.mmsi
+                            UNION ALL
+                            SELECT min(rowid) FROM sx.vessels WHERE imo = v.imo
+                        ))
+                   END AS sx_rowid
+            FROM main.vessels v
+        ) m
+        LEFT JOIN sx.vessels s ON s.rowid = m.sx_rowid
+        """,
+        {"whitespace": WHITESPACE},
     )
 
     count = 0
-    rows = vt_cur.fetchall()
-    for row in rows:
-        c_code = row[5].strip().upper() if row[5] else None
-        c_name = row[6].strip().upper() if row[6] else None
+    merged_rows = []
+    for row in vt_cur:
+        c_code = normalize_upper(row[5])
+        c_name = normalize_upper(row[6])
         if not c_code and c_name in countries:
             c_code = countries[c_name]
 
-        if not c_code:
-            # noinspection SqlDialectInspection
-            sx_cur.execute(
-                "select mmsi, imo, name, vessel_type, callsign, flag_country_code, flag_country, length, beam from vessels where mmsi = ? or imo = ?",
-                (
-                    row[0],
-                    row[1],
-                ),
-            )
-            sx_row = sx_cur.fetchone()
-            if sx_row:
-                # Normalize the country code and country name for consistent handling
-                c_code = sx_row[5].strip().upper() if sx_row[5] else None
+        if not c_code and row[9] is not None:
+            # Normalize the country code and country name for consistent handling
+            c_code = normalize_upper(row[10])
 
-                print(c_name, c_code)
-                # Store mapping for future lookups (use normalized country name)
-                if c_name and c_name not in countries and c_code:
-                    countries[c_name] = c_code
+            logger.debug("Learned country code %s for %s", c_code, c_name)
+            # Store mapping for future lookups (use normalized country name)
+            if c_name and c_name not in countries and c_code:
+                countries[c_name] = c_code
 
-        data = list(row)
+        data = list(row[:9])
         data[5] = c_code  # Update the country code in the row data
         if data[4] and len(data[4].strip()) == 0:
             data[4] = None  # Normalize empty callsign to NULL
-        print(data)
-        cursor.execute(
-            """
-            INSERT INTO vessels (
-                mmsi, imo, name, vessel_type, callsign, flag_country_code, flag_country, length, beam
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-            data,
-        )
+        logger.debug("Merged row: %s", data)
+        merged_rows.append(data)
         count += 1
         if count % 100 == 0:
-            print(f"Merged {count} vessels...", end="\r")
-            merged_conn.commit()
+            print(f"Collected {count} vessels...", end="\r")
+
+    # Insert everything in multi-row statements inside a single transaction
+    cursor.execute("BEGIN")
+    chunked_insert(cursor, merged_rows)
 
     # Commit changes and close connections
     merged_conn.commit()
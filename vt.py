@@ -1,14 +1,32 @@
 import logging
 import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from string import ascii_uppercase
 
 import requests_cache
+from requests.adapters import HTTPAdapter
 from selectolax.lexbor import LexborHTMLParser as Parser
 
-session = requests_cache.CachedSession("_vesseltrqcker_cache")
+session = requests_cache.CachedSession(
+    "_vesseltrqcker_cache", backend="sqlite", fast_save=True, wal=True
+)
+session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16))
 
 DB_NAME = "vesseltracker.db"
+# SQLite tuning for bulk loads (WAL keeps the DB crash-safe)
+SQLITE_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+    PRAGMA wal_autocheckpoint=10000;
+"""
 REQUEST_TIMEOUT = 15.0
+# Letters are scraped concurrently; DB_LOCK keeps SQLite writes single-writer
+WORKERS = 8
+DB_LOCK = threading.Lock()
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
     "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
@@ -24,8 +42,10 @@ logger = logging.getLogger(__name__)
 
 
 def setup_environment(db_name: str = DB_NAME) -> sqlite3.Connection:
-    conn = sqlite3.connect(db_name)
+    # Autocommit mode: transactions are managed explicitly with BEGIN/COMMIT
+    conn = sqlite3.connect(db_name, isolation_level=None, check_same_thread=False)
     cursor = conn.cursor()
+    cursor.executescript(SQLITE_PRAGMAS)
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS vessels (
@@ -42,54 +62,65 @@ def setup_environment(db_name: str = DB_NAME) -> sqlite3.Connection:
         )
     """
     )
-    conn.commit()
     return conn
 
 
-def scrape_html(html: str, conn: sqlite3.Connection):
+def parse_sizes(sizes: str) -> tuple[float | None, float | None]:
+    """Split a "<length> x <beam>" cell into floats, or (None, None) if absent."""
+    length, sep, beam = sizes.partition(" x ")
+    if not sep:
+        return None, None
+    return float(length), float(beam)
+
+
+def scrape_html(html: str | bytes, conn: sqlite3.Connection):
     query = """
         INSERT OR REPLACE INTO vessels (
             mmsi, imo, name, vessel_type, flag_country, callsign, length, beam
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     """
-    entries = []
-    batch_size = 100
     tree = Parser(html)
-    rows = tree.css("div.results-table > div.row")
-    for row in rows:
-        flag_country = row.css_first("div.flag-icon").attrs.get("title")
-        name = row.css_first("div.name-type > a.name").text(strip=True)
-        vessel_type = row.css_first("div.name-type > span.type").text(strip=True)
-        imo = row.css_first("div.imo > span").text(strip=True)
-        callsign = row.css_first("div.callsign > span").text(strip=True)
-        mmsi = row.css_first("div.mmsi > span").text(strip=True)
-        sizes = row.css_first("div.sizes > span").text(strip=True)
-        length, beam = (
-            [float(x) for x in sizes.split(" x ")] if " x " in sizes else (None, None)
+    # One CSS query per column over the whole table instead of six per row
+    prefix = "div.results-table > div.row > "
+    flag_countries = [n.attrs.get("title") for n in tree.css(prefix + "div.flag-icon")]
+    columns = [
+        [n.text(strip=True) for n in tree.css(prefix + selector)]
+        for selector in (
+            "div.name-type > a.name",
+            "div.name-type > span.type",
+            "div.imo > span",
+            "div.callsign > span",
+            "div.mmsi > span",
+            "div.sizes > span",
         )
+    ]
+    # Everything needed is now plain Python data; free the lexbor DOM right away
+    # instead of holding it while waiting on the DB lock
+    del tree
+    if any(len(col) != len(flag_countries) for col in columns):
+        logger.error("Mismatched column counts in results table; skipping page")
+        return False
 
-        entries.append(
-            (mmsi, imo, name, vessel_type, flag_country, callsign, length, beam)
+    names, vessel_types, imos, callsigns, mmsis, sizes = columns
+    entries = [
+        (mmsi, imo, name, vessel_type, flag_country, callsign, *parse_sizes(size))
+        for flag_country, name, vessel_type, imo, callsign, mmsi, size in zip(
+            flag_countries, names, vessel_types, imos, callsigns, mmsis, sizes
         )
-        # print(flag_country, name, vessel_type)
-        # Flush batches periodically
-        if len(entries) >= batch_size:
-            try:
-                with conn:
-                    conn.executemany(query, entries)
-            except sqlite3.DatabaseError as e:
-                logger.error("Database error during batch insert: %s", e)
-                return False
-            entries = []
+    ]
+    if not entries:
+        return False
 
-    # Final flush
-    if entries:
+    with DB_LOCK:
+        conn.execute("BEGIN")
         try:
-            with conn:
-                conn.executemany(query, entries)
+            conn.executemany(query, entries)
+            conn.execute("COMMIT")
         except sqlite3.DatabaseError as e:
-            logger.error("Database error during final insert: %s", e)
+            logger.error("Database error during insert: %s", e)
+            conn.rollback()
             return False
+    return True
 
 
 def fetch_vesseltracker_urls(char: str, page_max: int, conn: sqlite3.Connection):
@@ -98,12 +129,17 @@ def fetch_vesseltracker_urls(char: str, page_max: int, conn: sqlite3.Connection)
         response = session.get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT)
         if response.status_code == 200:
             print(f"{url} : OK")
-            scrape_html(response.text, conn)
+            # lexbor decodes bytes as UTF-8 regardless of the declared charset,
+            # so only skip requests' str decode when the page is UTF-8
+            if (response.encoding or "").lower() in ("utf-8", "utf8"):
+                scrape_html(response.content, conn)
+            else:
+                scrape_html(response.text, conn)
         else:
             print(f"{url} : ERR Status code: {response.status_code}")
             return
 
 
 conn = setup_environment()
-for c in ascii_uppercase:
-    fetch_vesseltracker_urls(c, 300, conn)
+with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+    list(executor.map(lambda c: fetch_vesseltracker_urls(c, 300, conn), ascii_uppercase))